@@ -1,14 +1,23 @@
 import os
+import re
+import html
 import time
 import sqlite3
+import math
 import hashlib
 import asyncio
+import calendar
+from collections import OrderedDict
 from datetime import datetime, timezone, timedelta
 
+import aiohttp
+import ahocorasick
 import feedparser
 from deep_translator import GoogleTranslator
 from telegram import Bot
 from telegram.constants import ParseMode
+from telegram.error import BadRequest, NetworkError, RetryAfter
+from telegram.request import HTTPXRequest
 
 # =========================
 # CONFIG
@@ -38,42 +47,279 @@ FEEDS = [
 
 POLL_SECONDS = 25
 MAX_PER_FEED = 25
+# بعض المصادر تنشر أخبار بتاريخ أقدم من آخر خبر؛ الـ dedup هو اللي يقرر، هذا بس يوفر شغل
+PUB_LOOKBACK_SECONDS = 6 * 3600
+FETCH_TIMEOUT = 10
+USER_AGENT = "Mozilla/5.0 (compatible; forex-news-bot/1.0)"
 SUMMARY_MAX_CHARS = 320
 
+KUWAIT_TZ = timezone(timedelta(hours=3))
+
 DB_FILE = "posted.db"
+POSTED_TTL_DAYS = 30
+PRUNE_EVERY = 100
+FLUSH_DEBOUNCE_SECONDS = 2
+BLOOM_CAPACITY = 200_000
+BLOOM_ERROR_RATE = 0.001
+RECENT_CACHE_SIZE = 4096
+TRANSLATION_CACHE_SIZE = 4096
+
+SEND_QUEUE_SIZE = 50
+SEND_DELAY_SECONDS = 1.2
+SEND_RETRIES = 3
+GLOBAL_SEND_RATE = 30  # حد تيليجرام العام لكل bot بالثانية
+BACKOFF_SECONDS = 60
 
 # =========================
 # DB (Persistent De-dup)
 # =========================
+class BloomFilter:
+    # "أكيد ما انرسل" بدون ما نفتح SQLite؛ "يمكن انرسل" نتأكد منها بالـ DB
+    def __init__(self, capacity: int, error_rate: float):
+        self.size = max(8, int(-capacity * math.log(error_rate) / (math.log(2) ** 2)))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, item: str):
+        digest = hashlib.blake2b(item.encode("utf-8"), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        return ((h1 + i * h2) % self.size for i in range(self.hashes))
+
+    def add(self, item: str) -> None:
+        for p in self._positions(item):
+            self.bits[p >> 3] |= 1 << (p & 7)
+
+    def __contains__(self, item: str) -> bool:
+        return all(self.bits[p >> 3] & (1 << (p & 7)) for p in self._positions(item))
+
+    def clear(self) -> None:
+        self.bits = bytearray(len(self.bits))
+
+POSTED_BLOOM = BloomFilter(BLOOM_CAPACITY, BLOOM_ERROR_RATE)
+
+# اتصال واحد طول عمر البرنامج بدل connect/close لكل استعلام
+_conn = None
+# اتصال ثاني للكتابة من الـ thread، عشان الـ commit ما يوقف الـ event loop
+_writer = None
+
 def init_db() -> None:
-    conn = sqlite3.connect(DB_FILE)
-    cur = conn.cursor()
-    cur.execute("""
+    global _conn, _writer
+    _conn = sqlite3.connect(DB_FILE, isolation_level=None, check_same_thread=False)
+    # WAL: الكتابة إضافة للـ log بدل نسخ rollback journal و fsync كامل لكل commit
+    _conn.execute("PRAGMA journal_mode=WAL")
+    _conn.execute("PRAGMA synchronous=NORMAL")
+
+    _conn.execute("""
         CREATE TABLE IF NOT EXISTS posted (
             id TEXT PRIMARY KEY,
             created_at TEXT
         )
     """)
-    conn.commit()
-    conn.close()
+    _conn.execute("""
+        CREATE TABLE IF NOT EXISTS feed_meta (
+            url TEXT PRIMARY KEY,
+            etag TEXT,
+            modified TEXT,
+            last_pub REAL
+        )
+    """)
+    _conn.execute("""
+        CREATE TABLE IF NOT EXISTS translations (
+            h TEXT PRIMARY KEY,
+            ar TEXT,
+            created_at TEXT
+        )
+    """)
+    # قواعد بيانات قديمة انعملت قبل عمود last_pub
+    cols = [r[1] for r in _conn.execute("PRAGMA table_info(feed_meta)")]
+    if "last_pub" not in cols:
+        _conn.execute("ALTER TABLE feed_meta ADD COLUMN last_pub REAL")
+
+    for url, etag, modified, last_pub in _conn.execute(
+        "SELECT url, etag, modified, last_pub FROM feed_meta"
+    ):
+        _feed_meta[url] = (etag, modified, last_pub or 0.0)
+    prune_posted()
+
+    _writer = sqlite3.connect(DB_FILE, isolation_level=None, check_same_thread=False)
+    _writer.execute("PRAGMA synchronous=NORMAL")
+
+def prune_posted() -> None:
+    # الأخبار القديمة ما ترجع بالـ RSS، فنحذفها عشان الجدول ما يكبر للأبد
+    cutoff = (datetime.now(timezone.utc) - timedelta(days=POSTED_TTL_DAYS)).isoformat()
+    _conn.execute("DELETE FROM posted WHERE created_at < ?", (cutoff,))
+    _conn.execute("DELETE FROM translations WHERE created_at < ?", (cutoff,))
+
+    # نبني الـ Bloom من جديد بعد الحذف عشان ما يتشبع بـ IDs قديمة
+    POSTED_BLOOM.clear()
+    for (item_id,) in _conn.execute("SELECT id FROM posted"):
+        POSTED_BLOOM.add(item_id)
+    # الكتابة تصير بالـ thread: IDs انرسلت أثناءها باقي ما وصلت الجدول، فنرجعها للـ Bloom
+    for item_id in _pending_marks:
+        POSTED_BLOOM.add(item_id)
+
+_marks_since_prune = 0
+
+# الـ IDs اللي انرسلت وباقي ما انكتبت بالـ DB (dict عشان يحفظ الترتيب)
+_pending_marks: dict = {}
+_dirty = asyncio.Event()
+
+# نفس الأخبار ترجع بكل دورة: نحفظ آخر IDs انرسلت (LRU) عشان ما نرجع لـ SQLite
+_recent_posted: OrderedDict = OrderedDict()
+
+def remember_posted(item_id: str) -> None:
+    _recent_posted[item_id] = None
+    _recent_posted.move_to_end(item_id)
+    if len(_recent_posted) > RECENT_CACHE_SIZE:
+        _recent_posted.popitem(last=False)
 
 def already_posted(item_id: str) -> bool:
-    conn = sqlite3.connect(DB_FILE)
-    cur = conn.cursor()
-    cur.execute("SELECT 1 FROM posted WHERE id=?", (item_id,))
-    row = cur.fetchone()
-    conn.close()
-    return row is not None
+    if item_id in _pending_marks:
+        return True
+    if item_id in _recent_posted:
+        _recent_posted.move_to_end(item_id)
+        return True
+    if item_id not in POSTED_BLOOM:
+        return False
+    row = _conn.execute("SELECT 1 FROM posted WHERE id=?", (item_id,)).fetchone()
+    if row is None:
+        return False
+    remember_posted(item_id)
+    return True
+
+def prefetch_posted(ids: list) -> None:
+    # الـ IDs اللي الـ bloom يقول "يمكن" وما هي بالذاكرة: استعلام IN واحد للـ feed كله
+    # بدل SELECT لكل خبر؛ اللي نلقاه يدخل الـ LRU فـ already_posted يجاوب بدون DB
+    todo = [
+        i for i in ids
+        if i not in _pending_marks and i not in _recent_posted and i in POSTED_BLOOM
+    ]
+    if not todo:
+        return
+    sql = "SELECT id FROM posted WHERE id IN (%s)" % ",".join("?" * len(todo))
+    for (item_id,) in _conn.execute(sql, todo):
+        remember_posted(item_id)
 
 def mark_posted(item_id: str) -> None:
-    conn = sqlite3.connect(DB_FILE)
-    cur = conn.cursor()
-    cur.execute(
-        "INSERT OR IGNORE INTO posted (id, created_at) VALUES (?, ?)",
-        (item_id, datetime.now(timezone.utc).isoformat())
+    # بدل commit لكل رسالة: نجمعها وتنكتب دفعة وحدة من periodic_flush
+    _pending_marks[item_id] = None
+    POSTED_BLOOM.add(item_id)
+    remember_posted(item_id)
+    _dirty.set()
+
+def write_batch(conn: sqlite3.Connection, ids: list, translations: list) -> None:
+    # وقت واحد للدفعة كلها؛ created_at بس للـ TTL فما نحتاج دقة الثانية
+    created_at = datetime.now(timezone.utc).isoformat()
+    conn.execute("BEGIN")
+    try:
+        conn.executemany(
+            "INSERT OR IGNORE INTO posted (id, created_at) VALUES (?, ?)",
+            [(item_id, created_at) for item_id in ids]
+        )
+        conn.executemany(
+            "INSERT OR REPLACE INTO translations (h, ar, created_at) VALUES (?, ?, ?)",
+            [(h, ar, created_at) for h, ar in translations]
+        )
+        conn.execute("COMMIT")
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+
+def batch_written(ids: list, translations: list) -> None:
+    # نشيل من pending بس اللي انكتب؛ اللي انضاف أثناء الكتابة يبقى للدفعة الجاية
+    for h, _ in translations:
+        _pending_translations.pop(h, None)
+    for item_id in ids:
+        _pending_marks.pop(item_id, None)
+
+    global _marks_since_prune
+    _marks_since_prune += len(ids)
+    if _marks_since_prune >= PRUNE_EVERY:
+        _marks_since_prune = 0
+        prune_posted()
+
+def flush_posted() -> None:
+    if not _pending_marks and not _pending_translations:
+        return
+    ids = list(_pending_marks)
+    translations = list(_pending_translations.items())
+    write_batch(_conn, ids, translations)
+    batch_written(ids, translations)
+
+async def periodic_flush() -> None:
+    while True:
+        await _dirty.wait()
+        await asyncio.sleep(FLUSH_DEBOUNCE_SECONDS)
+        _dirty.clear()
+        if not _pending_marks and not _pending_translations:
+            continue
+        ids = list(_pending_marks)
+        translations = list(_pending_translations.items())
+        try:
+            await asyncio.to_thread(write_batch, _writer, ids, translations)
+            batch_written(ids, translations)
+        except Exception as ex:
+            print("Flush error:", ex)
+
+# ETag/Last-Modified/last_pub لكل مصدر: نقرأها من الذاكرة، والـ DB بس عشان الـ restart
+_feed_meta: dict = {}
+
+def get_feed_meta(url: str) -> tuple:
+    return _feed_meta.get(url, (None, None, 0.0))
+
+def set_feed_meta(url: str, etag: str, modified: str, last_pub: float) -> None:
+    _feed_meta[url] = (etag, modified, last_pub)
+    _conn.execute(
+        "INSERT OR REPLACE INTO feed_meta (url, etag, modified, last_pub) VALUES (?, ?, ?, ?)",
+        (url, etag, modified, last_pub)
     )
-    conn.commit()
-    conn.close()
+
+# رقم يزيد كل ما خبر من المصدر ما انرسل، عشان run() ما يكتب فوق الـ invalidation
+_unsent_gen: dict = {}
+
+def feed_item_unsent(url: str, pub: float) -> None:
+    # خبر انضاف للطابور بس ما انرسل (فشل/انشال/إيقاف): ننسى ETag ونرجع last_pub لين تاريخه
+    # عشان الدورة الجاية تجيب المصدر كامل ويرجع الخبر
+    _, _, last_pub = get_feed_meta(url)
+    if pub:
+        last_pub = min(last_pub, pub)
+    set_feed_meta(url, None, None, last_pub)
+    _unsent_gen[url] = _unsent_gen.get(url, 0) + 1
+
+# كاش الترجمة: LRU بالذاكرة أول، وبعدين جدول translations عشان يبقى بعد الـ restart.
+# الكتابة للجدول تروح مع دفعة periodic_flush بدل commit على الـ event loop
+_translations: OrderedDict = OrderedDict()
+_pending_translations: dict = {}
+
+def translation_key(text: str) -> str:
+    return hashlib.blake2b(text.encode("utf-8"), digest_size=16).hexdigest()
+
+def remember_translation(text: str, ar: str) -> None:
+    _translations[text] = ar
+    _translations.move_to_end(text)
+    if len(_translations) > TRANSLATION_CACHE_SIZE:
+        _translations.popitem(last=False)
+
+def get_translation(text: str) -> str:
+    ar = _translations.get(text)
+    if ar is not None:
+        _translations.move_to_end(text)
+        return ar
+    key = translation_key(text)
+    ar = _pending_translations.get(key)
+    if ar is None:
+        row = _conn.execute("SELECT ar FROM translations WHERE h=?", (key,)).fetchone()
+        if row is None:
+            return None
+        ar = row[0]
+    remember_translation(text, ar)
+    return ar
+
+def set_translation(text: str, ar: str) -> None:
+    remember_translation(text, ar)
+    _pending_translations[translation_key(text)] = ar
+    _dirty.set()
 
 # =========================
 # HELPERS
@@ -81,33 +327,168 @@ def mark_posted(item_id: str) -> None:
 def clean(text: str) -> str:
     if not text:
         return ""
-    return " ".join(text.replace("\n", " ").split()).strip()
+    # split() بدون argument يقسم على أي whitespace ويشيل الأطراف
+    return " ".join(text.split())
+
+# وسوم HTML + روابط بنمط واحد: مرور واحد على النص بدل أكثر من sub
+STRIP_RE = re.compile(r"<[^>]+>|https?://\S+|www\.\S+", re.IGNORECASE)
+URL_RE = re.compile(r"https?://\S+|www\.\S+", re.IGNORECASE)
+
+ARABIC_RE = re.compile(r"[\u0600-\u06FF]")
+
+def clean_text(text: str, is_html: bool = True) -> str:
+    if not text:
+        return ""
+    if is_html:
+        # الملخص يوصل HTML: نشيل الـ tags وبعدين نفك الـ entities (&amp; ...) لنص عادي
+        text = html.unescape(STRIP_RE.sub(" ", text))
+    else:
+        # نص عادي (العنوان غالباً): "<" و ">" فيه جزء من الخبر، نشيل الروابط بس
+        text = URL_RE.sub(" ", text)
+    return " ".join(text.split())
+
+def analyze_text(text: str, is_html: bool = True) -> tuple:
+    # تنظيف + كشف العربي مع بعض، عشان ما نرجع نمسح النص مرة ثانية بعدين
+    cleaned = clean_text(text, is_html)
+    return cleaned, ARABIC_RE.search(cleaned) is not None
 
 def make_hash_id(title: str, link: str) -> str:
+    # لازم يبقى sha256 على نفس المدخلات: IDs الأخبار اللي بدون GUID محفوظة بـ posted.db،
+    # ولو تغير الـ hash تنرسل مرة ثانية
     raw = (clean(title) + "||" + clean(link)).encode("utf-8")
     return hashlib.sha256(raw).hexdigest()
 
+SOURCE_LABELS = {
+    "investing": "Investing",
+    "fxstreet": "FXStreet",
+    "arabictrader": "ArabicTrader",
+    "dailyforex": "DailyForex",
+}
+
+def entry_timestamp(entry) -> float:
+    # feedparser يحلل التاريخ مسبقاً إلى struct_time (UTC)
+    parsed = entry.get("published_parsed") or entry.get("updated_parsed")
+    return float(calendar.timegm(parsed)) if parsed else 0.0
+
+def fmt_dt(dt: datetime) -> str:
+    # نفس ناتج strftime('%Y-%m-%d %H:%M') بدون تحليل الـ format كل مرة
+    return f"{dt.year:04d}-{dt.month:02d}-{dt.day:02d} {dt.hour:02d}:{dt.minute:02d}"
+
 def source_label(feed_url: str) -> str:
     u = (feed_url or "").lower()
-    if "investing" in u:
-        return "Investing"
-    if "fxstreet" in u:
-        return "FXStreet"
-    if "arabictrader" in u:
-        return "ArabicTrader"
-    if "dailyforex" in u:
-        return "DailyForex"
+    for key, label in SOURCE_LABELS.items():
+        if key in u:
+            return label
     return "Source"
 
+# المصدر يعتمد على رابط الـ feed بس، فنحسبه مرة وحدة
+SOURCE_BY_URL = {u: source_label(u) for u in FEEDS}
+
+def translate_text(text: str) -> str:
+    return GoogleTranslator(source="auto", target="ar").translate(text)
+
 def to_arabic(text: str) -> str:
     text = clean(text)
     if not text:
         return ""
     try:
-        return GoogleTranslator(source="auto", target="ar").translate(text)
+        return translate_text(text)
     except:
         return text
 
+async def to_arabic_async(text: str, is_arabic: bool) -> str:
+    if is_arabic or not text:
+        return text
+    # نفس العنوان يتكرر بالـ RSS، فنشيك الكاش قبل طلب HTTP جديد
+    cached = get_translation(text)
+    if cached is not None:
+        return cached
+    # الترجمة طلب HTTP متزامن: نطلعها من الـ event loop
+    ar = await asyncio.to_thread(to_arabic, text)
+    # to_arabic يرجع النص نفسه لو فشلت الترجمة، فما نحفظه
+    if ar != text:
+        set_translation(text, ar)
+    return ar
+
+def build_automaton(categories: list) -> ahocorasick.Automaton:
+    index = {}
+    for cat, words in categories:
+        for w in words:
+            index.setdefault(w.lower(), set()).add(cat)
+
+    auto = ahocorasick.Automaton()
+    for kw, cats in index.items():
+        auto.add_word(kw, (kw, tuple(cats)))
+    auto.make_automaton()
+    return auto
+
+# =========================
+# FETCH (Concurrent RSS)
+# =========================
+async def fetch_feed(session: aiohttp.ClientSession, url: str) -> tuple:
+    # Conditional GET: لو المصدر ما تغير يرجع 304 بدون body ونتخطى التحليل
+    etag, modified, _ = get_feed_meta(url)
+    headers = {}
+    if etag:
+        headers["If-None-Match"] = etag
+    if modified:
+        headers["If-Modified-Since"] = modified
+
+    async with session.get(url, headers=headers) as resp:
+        if resp.status == 304:
+            return url, None, etag, modified, None
+        resp.raise_for_status()
+        body = await resp.read()
+        # نمرر content-type لـ feedparser عشان يعرف الـ encoding بدون تخمين
+        response_headers = {"content-type": resp.headers.get("Content-Type", "")}
+        return url, body, resp.headers.get("ETag"), resp.headers.get("Last-Modified"), response_headers
+
+# session وحدة طول عمر البرنامج: نعيد استخدام اتصالات TCP/TLS بدل handshake كل دورة
+_session = None
+
+def get_session() -> aiohttp.ClientSession:
+    global _session
+    if _session is None or _session.closed:
+        _session = aiohttp.ClientSession(
+            timeout=aiohttp.ClientTimeout(total=FETCH_TIMEOUT),
+            headers={"User-Agent": USER_AGENT, "Accept-Encoding": "gzip, deflate"},
+            connector=aiohttp.TCPConnector(limit=16, ttl_dns_cache=600)
+        )
+    return _session
+
+async def close_session() -> None:
+    if _session is not None and not _session.closed:
+        await _session.close()
+
+async def fetch_feeds() -> list:
+    # كل المصادر بنفس الوقت: زمن الدورة = أبطأ مصدر بدل مجموعهم
+    session = get_session()
+    results = await asyncio.gather(
+        *(fetch_feed(session, url) for url in FEEDS),
+        return_exceptions=True
+    )
+
+    fetched = []
+    for url, res in zip(FEEDS, results):
+        if isinstance(res, BaseException):
+            print("Fetch error:", url, res)
+            continue
+        if res[1] is None:
+            continue
+        fetched.append(res)
+
+    # تحليل الـ XML شغل CPU: نسويه بالـ threads عشان ما يوقف الـ event loop
+    parsed = await asyncio.gather(
+        *(
+            asyncio.to_thread(feedparser.parse, body, response_headers=response_headers)
+            for _, body, _, _, response_headers in fetched
+        )
+    )
+    return [
+        (url, feed, etag, modified)
+        for (url, _, etag, modified, _), feed in zip(fetched, parsed)
+    ]
+
 # =========================
 # FILTER: Remove Israel ECONOMIC only (keep war/politics)
 # =========================
@@ -141,12 +522,21 @@ WAR_POLITICS_WORDS = [
     "صراع","توتر","تصعيد","عقوبات","محادثات","دبلوماسية","سياسي","سياسة"
 ]
 
-def should_block_news(raw_title: str, raw_summary: str, link: str) -> bool:
-    combined = (raw_title + " " + raw_summary + " " + (link or "")).lower()
+# الثلاث قوائم بـ automaton وحد: مرور واحد على النص بدل any() لكل قائمة
+BLOCK_AC = build_automaton([
+    ("israel", ISRAEL_ECON_WORDS),
+    ("econ", ECONOMIC_WORDS),
+    ("war_pol", WAR_POLITICS_WORDS),
+])
 
-    has_israel = any(k in combined for k in ISRAEL_ECON_WORDS)
-    has_econ = any(k in combined for k in ECONOMIC_WORDS)
-    has_war_pol = any(k in combined for k in WAR_POLITICS_WORDS)
+def should_block_news(combined: str, link: str) -> bool:
+    found = set()
+    for _, (_, cats) in BLOCK_AC.iter(combined + " " + (link or "").lower()):
+        found.update(cats)
+
+    has_israel = "israel" in found
+    has_econ = "econ" in found
+    has_war_pol = "war_pol" in found
 
     # ❌ امنع فقط: إسرائيل + اقتصادي  (لكن إذا واضح حرب/سياسة، خله يمر)
     return (has_israel and has_econ and not has_war_pol)
@@ -193,14 +583,42 @@ NEGATIVE_WORDS = [
     "يهبط", "هبوط", "ينخفض", "خسائر", "ضعيف", "سلبي", "مخاطر", "ركود", "قلق", "أقل",
 ]
 
-def is_urgent(raw_title: str, raw_summary: str) -> bool:
-    combined = (raw_title + " " + raw_summary).lower()
-    return any(k.lower() in combined for k in URGENT_KEYWORDS)
+STRENGTH_KEYWORDS = [
+    "fed", "fomc", "powell", "cpi", "inflation", "nfp", "rate",
+    "الفيدرالي", "باول", "التضخم", "الوظائف", "الفائدة",
+]
+
+# الأصول بالترتيب اللي تنعرض فيه بالرسالة
+ASSET_KEYWORDS = [
+    ("الذهب", GOLD_KEYWORDS),
+    ("النفط", OIL_KEYWORDS),
+    ("الدولار", USD_KEYWORDS),
+    ("الين", JPY_KEYWORDS),
+    ("اليورو", EUR_KEYWORDS),
+    ("الجنيه الإسترليني", GBP_KEYWORDS),
+]
+
+KEYWORD_CATEGORIES = [
+    ("urgent", URGENT_KEYWORDS),
+    ("positive", POSITIVE_WORDS),
+    ("negative", NEGATIVE_WORDS),
+    ("strength", STRENGTH_KEYWORDS),
+] + ASSET_KEYWORDS
 
-def market_sentiment(raw_title: str, raw_summary: str) -> str:
-    combined = (raw_title + " " + raw_summary).lower()
-    pos = sum(1 for w in POSITIVE_WORDS if w.lower() in combined)
-    neg = sum(1 for w in NEGATIVE_WORDS if w.lower() in combined)
+# Aho-Corasick واحد لكل التصنيفات: مسح واحد للنص يطلع كل الكلمات الموجودة
+# (الكلمة الوحدة ممكن تكون بأكثر من تصنيف، مثل "cpi" عاجل + قوة)
+KEYWORD_AC = build_automaton(KEYWORD_CATEGORIES)
+
+def keyword_hits(combined: str) -> dict:
+    hits = {}
+    for _, (kw, cats) in KEYWORD_AC.iter(combined):
+        for cat in cats:
+            hits.setdefault(cat, set()).add(kw)
+    return hits
+
+def market_sentiment(hits: dict) -> str:
+    pos = len(hits.get("positive", ()))
+    neg = len(hits.get("negative", ()))
 
     if pos > neg and pos >= 1:
         return "إيجابي"
@@ -208,15 +626,11 @@ def market_sentiment(raw_title: str, raw_summary: str) -> str:
         return "سلبي"
     return "محايد"
 
-def news_strength(raw_title: str, raw_summary: str, urgent: bool) -> str:
-    combined = (raw_title + " " + raw_summary).lower()
+def news_strength(hits: dict, urgent: bool) -> str:
     score = 0
     if urgent:
         score += 3
-    for k in ["fed", "fomc", "powell", "cpi", "inflation", "nfp", "rate",
-              "الفيدرالي", "باول", "التضخم", "الوظائف", "الفائدة"]:
-        if k.lower() in combined:
-            score += 2
+    score += 2 * len(hits.get("strength", ()))
 
     if score >= 5:
         return "عالي جداً"
@@ -226,36 +640,56 @@ def news_strength(raw_title: str, raw_summary: str, urgent: bool) -> str:
         return "متوسط"
     return "منخفض"
 
-def affected_assets(raw_title: str, raw_summary: str) -> str:
-    combined = (raw_title + " " + raw_summary).lower()
-    assets = []
-
-    if any(k in combined for k in GOLD_KEYWORDS):
-        assets.append("الذهب")
-    if any(k in combined for k in OIL_KEYWORDS):
-        assets.append("النفط")
-    if any(k in combined for k in USD_KEYWORDS):
-        assets.append("الدولار")
-    if any(k in combined for k in JPY_KEYWORDS):
-        assets.append("الين")
-    if any(k in combined for k in EUR_KEYWORDS):
-        assets.append("اليورو")
-    if any(k in combined for k in GBP_KEYWORDS):
-        assets.append("الجنيه الإسترليني")
-
+def affected_assets(hits: dict) -> str:
+    assets = [label for label, _ in ASSET_KEYWORDS if label in hits]
     if not assets:
         return "العملات / الأسواق"
-    return "، ".join(dict.fromkeys(assets))
+    return "، ".join(assets)
 
-def golden_warning_flag(raw_title: str, raw_summary: str) -> str:
-    combined = (raw_title + " " + raw_summary).lower()
-    if any(k in combined for k in GOLD_KEYWORDS):
+def golden_warning_flag(hits: dict) -> str:
+    if "الذهب" in hits:
         return "🟡 <b>تحذير ذهبي</b>: خبر قد يؤثر على الذهب (XAUUSD)"
     return ""
 
+def classify(combined: str) -> tuple:
+    # مسح واحد للخبر كله بدل ما كل دالة تمسح النص من جديد
+    hits = keyword_hits(combined)
+    urgent = "urgent" in hits
+    return (
+        urgent,
+        news_strength(hits, urgent),
+        market_sentiment(hits),
+        affected_assets(hits),
+        golden_warning_flag(hits),
+    )
+
 # =========================
 # MESSAGE BUILDER (No Link, Source only)
 # =========================
+STRENGTH_LABELS = ("عالي جداً", "عالي", "متوسط", "منخفض")
+SENTIMENT_LABELS = ("إيجابي", "سلبي", "محايد")
+
+# الجزء الثابت من الرسالة محسوب مسبقاً لكل (قوة، اتجاه)؛ يتبقى فقط الأصول والوقت والمصدر
+STATS_TEMPLATES = {
+    (strength, sentiment): (
+        "\n━━━━━━━━━━━━━━━━━━━━\n"
+        f"📊 <b>قوة الخبر</b>: {strength}\n"
+        f"🧠 <b>اتجاه السوق</b>: {sentiment}\n"
+        "📌 <b>الأصول المتأثرة</b>: {assets}\n"
+        "🕒 <b>الوقت</b>: {time} (الكويت)\n"
+        "🔗 <b>المصدر</b>: {src}\n"
+        "━━━━━━━━━━━━━━━━━━━━"
+        + SIGNATURE
+        + FOLLOW_FOOTER
+    )
+    for strength in STRENGTH_LABELS
+    for sentiment in SENTIMENT_LABELS
+}
+
+# الرسالة نفسها فيها <b> فما نقدر نعمل escape لها كلها؛ نعمل escape للعنوان والملخص بس
+# (نص عادي بعد clean_text) بمرور translate واحد بدل html.escape
+HTML_ESCAPE = str.maketrans({"&": "&amp;", "<": "&lt;", ">": "&gt;"})
+
 def build_message(
     title_ar: str,
     summary_ar: str,
@@ -264,7 +698,8 @@ def build_message(
     strength_ar: str,
     sentiment_ar: str,
     assets_ar: str,
-    golden_warning: str
+    golden_warning: str,
+    now_str: str = None
 ) -> str:
     title_ar = clean(title_ar)
     summary_ar = clean(summary_ar)
@@ -272,69 +707,212 @@ def build_message(
     if summary_ar:
         summary_ar = summary_ar[:SUMMARY_MAX_CHARS] + ("..." if len(summary_ar) > SUMMARY_MAX_CHARS else "")
 
+    title_ar = title_ar.translate(HTML_ESCAPE)
+    summary_ar = summary_ar.translate(HTML_ESCAPE)
+
     header = "🚨 <b>عاجل</b>\n" if urgent else "📰 "
-    kuwait_time = datetime.now(timezone.utc).astimezone(timezone(timedelta(hours=3))).strftime('%Y-%m-%d %H:%M')
+    kuwait_time = now_str or fmt_dt(datetime.now(KUWAIT_TZ))
 
-    msg = f"{header}<b>{title_ar}</b>\n"
+    parts = [f"{header}<b>{title_ar}</b>\n"]
     if summary_ar:
-        msg += f"\n{summary_ar}\n"
+        parts.append(f"\n{summary_ar}\n")
 
     if golden_warning:
-        msg += f"\n{golden_warning}\n"
+        parts.append(f"\n{golden_warning}\n")
 
-    msg += (
-        "\n━━━━━━━━━━━━━━━━━━━━\n"
-        f"📊 <b>قوة الخبر</b>: {strength_ar}\n"
-        f"🧠 <b>اتجاه السوق</b>: {sentiment_ar}\n"
-        f"📌 <b>الأصول المتأثرة</b>: {assets_ar}\n"
-        f"🕒 <b>الوقت</b>: {kuwait_time} (الكويت)\n"
-        f"🔗 <b>المصدر</b>: {src}\n"
-        "━━━━━━━━━━━━━━━━━━━━"
-    )
+    parts.append(STATS_TEMPLATES[(strength_ar, sentiment_ar)].format(
+        assets=assets_ar,
+        time=kuwait_time,
+        src=src
+    ))
+    return "".join(parts)
 
-    msg += SIGNATURE
-    msg += FOLLOW_FOOTER
-    return msg
+# =========================
+# SENDER (Bounded queue)
+# =========================
+class TokenBucket:
+    def __init__(self, rate: float, capacity: float):
+        self.base_rate = rate
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.last = time.monotonic()
+        self.slow_until = 0.0
+
+    async def acquire(self) -> None:
+        while True:
+            now = time.monotonic()
+            if self.slow_until and now >= self.slow_until:
+                self.rate = self.base_rate
+                self.slow_until = 0.0
+            self.tokens = min(self.capacity, self.tokens + (now - self.last) * self.rate)
+            self.last = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return
+            await asyncio.sleep((1 - self.tokens) / self.rate)
+
+    def backoff(self) -> None:
+        # AIMD: بعد 429 نقص المعدل للنص لمدة دقيقة
+        self.rate /= 2
+        self.slow_until = time.monotonic() + BACKOFF_SECONDS
+
+class Sender:
+    def __init__(self, bot: Bot):
+        self.bot = bot
+        self.q: asyncio.Queue = asyncio.Queue(maxsize=SEND_QUEUE_SIZE)
+        self.queued: set = set()
+        # نحترم حد القناة والحد العام قبل الإرسال بدل ما ننتظر RetryAfter
+        self.chat_bucket = TokenBucket(1 / SEND_DELAY_SECONDS, 1)
+        self.global_bucket = TokenBucket(GLOBAL_SEND_RATE, GLOBAL_SEND_RATE)
+
+    def enqueue(self, item_id: str, text: str, url: str, pub: float) -> None:
+        # الطابور محدود: لو امتلى نشيل أقدم خبر بدل ما تتكدس أخبار قديمة قدام الجديدة.
+        # نعلمه كأنه انعالج عشان ما يرجع بالدورة الجاية (خبر قديم ما نبي نرسله)
+        if self.q.full():
+            old_id, _, _, _ = self.q.get_nowait()
+            self.q.task_done()
+            self.queued.discard(old_id)
+            mark_posted(old_id)
+            print("Send queue full, dropped:", old_id)
+        self.q.put_nowait((item_id, text, url, pub))
+        self.queued.add(item_id)
+
+    def drop_pending(self) -> None:
+        # وقت الإيقاف: اللي باقي بالطابور يرجع ينجاب بعد الـ restart
+        while not self.q.empty():
+            item_id, _, url, pub = self.q.get_nowait()
+            self.q.task_done()
+            self.queued.discard(item_id)
+            feed_item_unsent(url, pub)
+
+    async def send(self, text: str) -> None:
+        for attempt in range(SEND_RETRIES):
+            await self.chat_bucket.acquire()
+            await self.global_bucket.acquire()
+            try:
+                await self.bot.send_message(
+                    chat_id=CHANNEL,
+                    text=text,
+                    parse_mode=ParseMode.HTML,
+                    disable_web_page_preview=True  # لأن ماكو رابط، وخليها True عشان ما يطلع preview مزعج
+                )
+                return
+            except RetryAfter as ex:
+                self.chat_bucket.backoff()
+                await asyncio.sleep(ex.retry_after)
+            except BadRequest:
+                raise
+            except NetworkError:
+                if attempt == SEND_RETRIES - 1:
+                    raise
+                await asyncio.sleep(2 ** attempt)
+        raise RuntimeError("send failed after retries")
+
+    async def worker(self) -> None:
+        while True:
+            item_id, text, url, pub = await self.q.get()
+            try:
+                await self.send(text)
+                mark_posted(item_id)
+            except asyncio.CancelledError:
+                feed_item_unsent(url, pub)
+                raise
+            except BadRequest as ex:
+                # تيليجرام رافض الرسالة نفسها: إعادة المحاولة ما تفيد، فنعلمها ونتخطاها
+                print("Send rejected, skipped:", item_id, ex)
+                mark_posted(item_id)
+            except Exception as ex:
+                print("Send error:", item_id, ex)
+                feed_item_unsent(url, pub)
+            finally:
+                self.queued.discard(item_id)
+                self.q.task_done()
 
 # =========================
 # MAIN LOOP
 # =========================
 async def main() -> None:
     init_db()
-    bot = Bot(token=TOKEN)
+    # اتصال HTTP/2 واحد يبقى مفتوح مع api.telegram.org بدل TLS handshake لكل إرسال
+    request = HTTPXRequest(
+        connection_pool_size=8,
+        connect_timeout=5,
+        read_timeout=20,
+        http_version="2",
+    )
+    bot = Bot(token=TOKEN, request=request)
+    sender = Sender(bot)
+    flusher = asyncio.create_task(periodic_flush())
+    send_worker = asyncio.create_task(sender.worker())
 
+    try:
+        await run(sender)
+    finally:
+        send_worker.cancel()
+        flusher.cancel()
+        await asyncio.gather(send_worker, flusher, return_exceptions=True)
+        sender.drop_pending()
+        flush_posted()
+        await close_session()
+
+async def run(sender: Sender) -> None:
     while True:
         try:
-            for url in FEEDS:
-                feed = feedparser.parse(url)
-                src = source_label(url)
+            fetched = await fetch_feeds()
+            # كل أخبار الدورة تاخذ نفس الدقيقة تقريباً، فنحسب الوقت مرة وحدة
+            now_str = fmt_dt(datetime.now(KUWAIT_TZ))
+            for url, feed, etag, modified in fetched:
+                src = SOURCE_BY_URL.get(url) or source_label(url)
+                _, _, last_pub = get_feed_meta(url)
+                newest_pub = last_pub
+                gen = _unsent_gen.get(url, 0)
+
+                entries = feed.entries[:MAX_PER_FEED]
+                prefetch_posted([e.get("id") for e in entries if e.get("id")])
+
+                for entry in entries:
+                    # أخبار أقدم بكثير من آخر خبر انعالج: نتخطاها بدون تنظيف/تحليل
+                    pub = entry_timestamp(entry)
+                    if pub and pub < last_pub - PUB_LOOKBACK_SECONDS:
+                        continue
+                    # تاريخ بالمستقبل (غلط timezone بالمصدر) ما يقدم last_pub أكثر من الحين
+                    newest_pub = max(newest_pub, min(pub, time.time()))
+
+                    # لو فيه GUID نتحقق من التكرار قبل أي تنظيف/تحليل
+                    item_id = entry.get("id")
+                    if item_id and (already_posted(item_id) or item_id in sender.queued):
+                        continue
 
-                for entry in feed.entries[:MAX_PER_FEED]:
-                    raw_title = clean(entry.get("title", ""))
+                    raw_title, title_is_ar = analyze_text(
+                        entry.get("title", ""),
+                        is_html=entry.get("title_detail", {}).get("type") == "text/html"
+                    )
                     link = clean(entry.get("link", ""))
-                    raw_summary = clean(entry.get("summary") or entry.get("description") or "")
+                    raw_summary, summary_is_ar = analyze_text(entry.get("summary") or entry.get("description") or "")
 
                     if not raw_title and not link:
                         continue
 
-                    # ✅ فلترة: شيل أخبار إسرائيل الاقتصادية فقط
-                    if should_block_news(raw_title, raw_summary, link):
-                        continue
+                    # نص واحد lowercase للخبر يستخدمه الفلتر والتصنيف
+                    combined = (raw_title + " " + raw_summary).lower()
 
-                    item_id = entry.get("id") or make_hash_id(raw_title, link)
-                    if already_posted(item_id):
+                    # ✅ فلترة: شيل أخبار إسرائيل الاقتصادية فقط
+                    if should_block_news(combined, link):
                         continue
 
-                    urgent = is_urgent(raw_title, raw_summary)
+                    if not item_id:
+                        item_id = make_hash_id(entry.get("title", ""), link)
+                        if already_posted(item_id) or item_id in sender.queued:
+                            continue
 
-                    # Translate to Arabic
-                    title_ar = to_arabic(raw_title)
-                    summary_ar = to_arabic(raw_summary)
+                    urgent, strength_ar, sentiment_ar, assets_ar, golden_warning = classify(combined)
 
-                    sentiment_ar = market_sentiment(raw_title, raw_summary)
-                    strength_ar = news_strength(raw_title, raw_summary, urgent)
-                    assets_ar = affected_assets(raw_title, raw_summary)
-                    golden_warning = golden_warning_flag(raw_title, raw_summary)
+                    # Translate to Arabic (النص العربي ما يحتاج ترجمة)
+                    title_ar, summary_ar = await asyncio.gather(
+                        to_arabic_async(raw_title, title_is_ar),
+                        to_arabic_async(raw_summary, summary_is_ar)
+                    )
 
                     text = build_message(
                         title_ar=title_ar,
@@ -344,18 +922,17 @@ async def main() -> None:
                         strength_ar=strength_ar,
                         sentiment_ar=sentiment_ar,
                         assets_ar=assets_ar,
-                        golden_warning=golden_warning
+                        golden_warning=golden_warning,
+                        now_str=now_str
                     )
 
-                    await bot.send_message(
-                        chat_id=CHANNEL,
-                        text=text,
-                        parse_mode=ParseMode.HTML,
-                        disable_web_page_preview=True  # لأن ماكو رابط، وخليها True عشان ما يطلع preview مزعج
-                    )
+                    sender.enqueue(item_id, text, url, pub)
 
-                    mark_posted(item_id)
-                    await asyncio.sleep(1.2)
+                # نحفظ ETag بعد ما نخلص المصدر كامل، عشان لو صار خطأ بالنص نعيد المحاولة.
+                # الإرسال يصير بعدين: لو خبر فشل أو انشال من الطابور، feed_item_unsent يرجع
+                # الـ meta؛ ولو صار هذا أثناء المعالجة ما نكتب فوقه
+                if _unsent_gen.get(url, 0) == gen:
+                    set_feed_meta(url, etag, modified, newest_pub)
 
             await asyncio.sleep(POLL_SECONDS)
 